@@ -1,29 +1,42 @@
 import sys
 import os
-import json
-import subprocess
 import tempfile
 import shutil
-import wave
-import struct
 import bisect
+import atexit
 import ctypes
+import functools
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QPushButton, QCheckBox, 
                              QScrollArea, QFileDialog, QMessageBox, QFrame, 
                              QSizePolicy, QSlider, QDoubleSpinBox, QStackedWidget, 
-                             QGraphicsView, QGraphicsScene, QStyle, QGridLayout)
-from PyQt6.QtCore import Qt, QUrl, pyqtSignal, QSize, QEvent, QRectF, QPointF
+                             QGraphicsView, QGraphicsScene, QStyle, QGridLayout, 
+                             QProgressBar)
+from PyQt6.QtCore import Qt, QUrl, pyqtSignal, QSize, QEvent, QRect, QRectF, QPointF, QLine, QTimer, QThreadPool
 from PyQt6.QtGui import (QPainter, QColor, QPen, QBrush, QAction, QKeySequence, 
                          QDragEnterEvent, QDropEvent, QDragMoveEvent, QIcon, QFont, 
-                         QLinearGradient, QPainterPath, QPixmap)
+                         QLinearGradient, QPainterPath, QPixmap, QFontMetrics)
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PyQt6.QtMultimediaWidgets import QGraphicsVideoItem
 
 # Import moduli locali
 from utils import FFMPEG_BIN, FFPROBE_BIN, format_time
-from workers import AudioExtractorThread, ExportThread, KeyframeLoaderThread
+from workers import AudioExtractor, ExportThread, KeyframeLoaderThread, ProbeThread, FFmpegCheckThread
+
+# Il grafo audio (volume x N + amix + dynaudnorm/loudnorm) per default usa un solo thread: lo si distribuisce sui core
+FILTER_THREAD_ARGS = ['-filter_complex_threads', str(max(2, (os.cpu_count() or 2) // 2))]
+
+# Quanto prima della fine della finestra di keyframe già letta si chiede la successiva
+KEYFRAME_MARGIN_MS = 60_000
+KEYFRAME_WINDOW_MS = KeyframeLoaderThread.WINDOW_SEC * 1000
+
+def keyframes_cover(windows, start_ms, end_ms):
+    """True se tutte le finestre di keyframe tra start_ms e end_ms sono già state lette"""
+    return all(w in windows for w in range(int(start_ms) // KEYFRAME_WINDOW_MS, int(end_ms) // KEYFRAME_WINDOW_MS + 1))
+
+# Codec audio che l'MP4 di uscita accetta in stream copy
+MP4_COPY_AUDIO_CODECS = {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus', 'flac'}
 
 # --- HELPER PER RISORSE INTERNE (ICONA APP) ---
 
@@ -44,6 +57,8 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 # --- HELPER ICONE ---
+# Le icone non cambiano durante l'esecuzione: si cercano su disco una volta sola
+@functools.lru_cache(maxsize=64)
 def load_custom_icon(name, fallback_text, system_icon=None):
     base_path = os.path.dirname(os.path.abspath(__file__))
     icon_path = os.path.join(base_path, "icons", name)
@@ -69,36 +84,64 @@ class MainTimeline(QWidget):
         self.in_point = 0
         self.out_point = 0
         self.nearest_keyframe = -1
+        self.keyframes = []
+        self.keyframe_windows = frozenset()
+        self.is_scrubbing = False
+        # Barra, selezione e marker cambiano di rado: stanno in un pixmap, ad ogni tick si disegna solo il cursore
+        self._base_pixmap = None
+        self._cursor_pen = QPen(QColor("#ffffff"), 2)
         self.setStyleSheet("background-color: #222; border-top: 1px solid #555;")
 
+    def _invalidate(self):
+        self._base_pixmap = None
+        self.update()
+
     def set_duration(self, duration):
         self.duration = duration
         self.reset_points()
-        self.update()
 
     def reset_points(self):
         self.in_point = 0
         self.out_point = self.duration
         self.nearest_keyframe = -1
-        self.update()
+        self._invalidate()
+
+    def _cursor_x(self, ms):
+        if self.duration <= 0: return 0
+        return int((ms / self.duration) * self.width())
 
     def set_position(self, pos):
+        old_x = self._cursor_x(self.position)
         self.position = pos
-        self.update()
+        new_x = self._cursor_x(pos)
+        if new_x == old_x: return
+        # Ridisegna solo le due strisce del cursore: il resto sta nel pixmap di base
+        h = self.height()
+        self.update(QRect(old_x - 2, 0, 4, h))
+        self.update(QRect(new_x - 2, 0, 4, h))
     
+    def set_keyframes(self, keyframes, windows=frozenset()):
+        self.keyframes = keyframes
+        self.keyframe_windows = windows
+
     def set_nearest_keyframe(self, ms):
+        if ms == self.nearest_keyframe: return
         self.nearest_keyframe = ms
-        self.update()
+        self._invalidate()
 
     def set_in_point(self):
         self.in_point = self.position
         if self.in_point > self.out_point: self.out_point = self.duration
-        self.update()
+        self._invalidate()
 
     def set_out_point(self):
         self.out_point = self.position
         if self.out_point < self.in_point: self.in_point = 0
-        self.update()
+        self._invalidate()
+
+    def resizeEvent(self, event):
+        self._base_pixmap = None
+        super().resizeEvent(event)
 
     def mousePressEvent(self, event):
         if self.duration > 0 and event.button() == Qt.MouseButton.LeftButton:
@@ -106,41 +149,67 @@ class MainTimeline(QWidget):
 
     def mouseMoveEvent(self, event):
         if self.duration > 0 and (event.buttons() & Qt.MouseButton.LeftButton):
+            self.is_scrubbing = True
+            self._handle_click(event.pos().x())
+
+    def mouseReleaseEvent(self, event):
+        if self.is_scrubbing and event.button() == Qt.MouseButton.LeftButton:
+            # Fine trascinamento: seek esatto al punto di rilascio
+            self.is_scrubbing = False
             self._handle_click(event.pos().x())
 
     def _handle_click(self, x):
-        pct = x / self.width()
+        pct = max(0.0, min(1.0, x / self.width()))
         ms = int(self.duration * pct)
+        if self.is_scrubbing and self.keyframes:
+            # Durante il trascinamento si salta al keyframe precedente: il decoder non
+            # deve ridecodificare il GOP fino a un punto arbitrario ad ogni pixel.
+            # Solo se la zona è già stata letta, altrimenti seek esatto
+            i = bisect.bisect_right(self.keyframes, ms) - 1
+            if i >= 0 and keyframes_cover(self.keyframe_windows, self.keyframes[i], ms): ms = self.keyframes[i]
         self.seek_requested.emit(ms)
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        w = self.width()
-        h = self.height()
+    def _render_base_pixmap(self):
+        w, h = self.width(), self.height()
+        pixmap = QPixmap(self.size())
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
         painter.fillRect(0, 10, w, h-20, QColor("#333"))
 
-        if self.duration <= 0: return
+        if self.duration > 0:
+            inv = w / self.duration # una divisione sola per tutti i marker
+            x_in = int(self.in_point * inv)
+            x_out = int(self.out_point * inv)
+            sel_width = x_out - x_in
+            
+            if sel_width > 0:
+                painter.fillRect(x_in, 10, sel_width, h-20, QColor("#0078d7"))
 
-        x_in = int((self.in_point / self.duration) * w) if self.duration > 0 else 0
-        x_out = int((self.out_point / self.duration) * w) if self.duration > 0 else w
-        sel_width = x_out - x_in
-        
-        if sel_width > 0:
-            painter.fillRect(x_in, 10, sel_width, h-20, QColor("#0078d7"))
+            # Keyframe Marker (Giallo)
+            if self.nearest_keyframe >= 0:
+                x_key = int(self.nearest_keyframe * inv)
+                painter.setPen(QPen(QColor("#ffd700"), 2))
+                painter.drawLine(x_key, 0, x_key, h)
 
-        # Keyframe Marker (Giallo)
-        if self.nearest_keyframe >= 0:
-            x_key = int((self.nearest_keyframe / self.duration) * w)
-            painter.setPen(QPen(QColor("#ffd700"), 2))
-            painter.drawLine(x_key, 0, x_key, h)
+            # Markers In/Out
+            painter.setPen(QPen(QColor("#00ff00"), 2)); painter.drawLine(x_in, 0, x_in, h)
+            painter.setPen(QPen(QColor("#ff0000"), 2)); painter.drawLine(x_out, 0, x_out, h)
+        painter.end()
+        return pixmap
 
-        # Markers In/Out
-        painter.setPen(QPen(QColor("#00ff00"), 2)); painter.drawLine(x_in, 0, x_in, h)
-        painter.setPen(QPen(QColor("#ff0000"), 2)); painter.drawLine(x_out, 0, x_out, h)
+    def paintEvent(self, event):
+        if self._base_pixmap is None or self._base_pixmap.size() != self.size():
+            self._base_pixmap = self._render_base_pixmap()
+            self._w_over_dur = self.width() / self.duration if self.duration > 0 else 0
+
+        painter = QPainter(self)
+        dirty = event.rect()
+        painter.drawPixmap(dirty, self._base_pixmap, dirty)
+        if self.duration <= 0: return
 
         # Cursor
-        x_pos = int((self.position / self.duration) * w)
-        painter.setPen(QPen(QColor("#ffffff"), 2)); painter.drawLine(x_pos, 0, x_pos, h)
+        x_pos = int(self.position * self._w_over_dur)
+        painter.setPen(self._cursor_pen); painter.drawLine(x_pos, 0, x_pos, self.height())
 
 
 # --- WAVEFORM WIDGET ---
@@ -152,62 +221,86 @@ class WaveformWidget(QWidget):
         self.duration_ms = 0
         self.current_position_ms = 0
         self.gain_linear = 1.0
+        self._wave_pixmap = None # sfondo + barre per la dimensione corrente
+        # Colori e penne creati una volta sola, non ad ogni paintEvent
+        self._bg_color = QColor("#1a1a1a")
+        self._wave_pen = QPen(QColor("#00bcd4"))
+        self._boost_pen = QPen(QColor("#00e5ff"))
+        self._cursor_pen = QPen(QColor("white"), 1, Qt.PenStyle.DashLine)
         self.setStyleSheet("background-color: #1a1a1a; border: 1px solid #333;")
 
     def set_gain_db(self, db):
-        self.gain_linear = 10 ** (db / 20.0)
+        gain = 10 ** (db / 20.0)
+        # Slider e spinbox ripetono lo stesso valore: niente ricostruzione del pixmap
+        if gain == self.gain_linear and self._wave_pixmap is not None: return
+        self.gain_linear = gain
+        self._wave_pixmap = None
         self.update()
 
-    def load_data(self, file_path):
-        if not os.path.exists(file_path): return
-        try:
-            with wave.open(file_path, 'r') as wf:
-                n_frames = wf.getnframes()
-                fr = wf.getframerate()
-                self.duration_ms = (n_frames / fr) * 1000
-                raw = wf.readframes(n_frames)
-                count = len(raw) // 2
-                fmt = f"<{count}h"
-                samples = struct.unpack(fmt, raw)
-                target = 2000
-                step = max(1, count // target)
-                self.samples = []
-                for i in range(0, count, step):
-                    chunk = samples[i:i+step]
-                    if chunk:
-                        val = max(abs(x) for x in chunk) / 32768.0
-                        self.samples.append(val)
-                self.update()
-        except: pass
+    def set_peaks(self, peaks, duration_ms):
+        self.samples = peaks
+        self.duration_ms = duration_ms
+        self._wave_pixmap = None
+        self.update()
+
+    def _cursor_x(self, ms):
+        if self.duration_ms <= 0: return 0
+        return int((ms / self.duration_ms) * self.width())
 
     def set_position(self, ms):
+        old_x = self._cursor_x(self.current_position_ms)
         self.current_position_ms = ms
-        self.update()
+        new_x = self._cursor_x(ms)
+        if new_x == old_x: return
+        # Ridisegna solo le due strisce del cursore invece di tutto il widget
+        h = self.height()
+        self.update(QRect(old_x - 2, 0, 4, h))
+        self.update(QRect(new_x - 2, 0, 4, h))
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.fillRect(self.rect(), QColor("#1a1a1a"))
-        if not self.samples: return
+    def resizeEvent(self, event):
+        self._wave_pixmap = None
+        super().resizeEvent(event)
+
+    def _compute_bars(self):
         w, h, mid = self.width(), self.height(), self.height() / 2
         total = len(self.samples)
-        step = total / w
-        
-        pen = QPen(QColor("#00bcd4"))
-        if self.gain_linear > 1.0: pen.setColor(QColor("#00e5ff"))
-        painter.setPen(pen)
-
+        scale = self.gain_linear * (h - 4) / 2 / 32768.0
+        lines = []
         for x in range(w):
-            idx = int(x * step)
-            if idx >= total: break
-            val = self.samples[idx] * self.gain_linear
-            if val > 1.0: val = 1.0
-            bar_h = val * (h - 4)
-            painter.drawLine(int(x), int(mid - bar_h/2), int(x), int(mid + bar_h/2))
+            start = x * total // w
+            if start >= total: break
+            # Max del bucket invece del picco più vicino: con la finestra più stretta dei dati
+            # nessun transiente sparisce; max() sulla slice gira in C
+            end = max(start + 1, (x + 1) * total // w)
+            half = min(max(self.samples[start:end]) * scale, (h - 4) / 2)
+            lines.append(QLine(x, int(mid - half), x, int(mid + half)))
+        return lines
+
+    def _render_waveform_pixmap(self):
+        """Disegna sfondo e barre in un pixmap: cambia solo con dimensione, dati o gain."""
+        pixmap = QPixmap(self.size())
+        pixmap.fill(self._bg_color)
+        if not self.samples: return pixmap
+        painter = QPainter(pixmap)
+        painter.setPen(self._boost_pen if self.gain_linear > 1.0 else self._wave_pen)
+        painter.drawLines(self._compute_bars())
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        if self._wave_pixmap is None or self._wave_pixmap.size() != self.size():
+            self._wave_pixmap = self._render_waveform_pixmap()
+
+        painter = QPainter(self)
+        # Durante il play si copia solo la regione sporca (le strisce del cursore)
+        dirty = event.rect()
+        painter.drawPixmap(dirty, self._wave_pixmap, dirty)
+        if not self.samples: return
 
         if self.duration_ms > 0:
-            x_pos = int((self.current_position_ms / self.duration_ms) * w)
-            painter.setPen(QPen(QColor("white"), 1, Qt.PenStyle.DashLine))
-            painter.drawLine(x_pos, 0, x_pos, h)
+            x_pos = self._cursor_x(self.current_position_ms)
+            painter.setPen(self._cursor_pen)
+            painter.drawLine(x_pos, 0, x_pos, self.height())
 
 
 # --- AUDIO TRACK WIDGET ---
@@ -218,6 +311,7 @@ class AudioTrackWidget(QFrame):
         super().__init__()
         self.setFrameShape(QFrame.Shape.StyledPanel)
         self.index = index
+        self.codec = track_info.get('codec_name', '')
         self.temp_file = os.path.join(temp_dir, f"track_{index}.wav")
         self.current_db = 0.0
         self.is_active = True
@@ -257,12 +351,8 @@ class AudioTrackWidget(QFrame):
         self.player.setAudioOutput(self.audio_out)
         self.update_volume()
 
-        self.extractor = AudioExtractorThread(file_path, index, self.temp_file)
-        self.extractor.finished_extraction.connect(self.on_ready)
-        self.extractor.start()
-
-    def on_ready(self, path, idx):
-        self.waveform.load_data(path)
+    def on_ready(self, path, idx, peaks, duration_ms):
+        self.waveform.set_peaks(peaks, duration_ms)
         if os.path.exists(path): 
             self.player.setSource(QUrl.fromLocalFile(path))
             self.track_loaded.emit(self)
@@ -270,6 +360,10 @@ class AudioTrackWidget(QFrame):
     def on_toggle_active(self, checked):
         self.is_active = checked
         self.update_volume()
+        # Una traccia esclusa non decodifica né tiene aperta l'uscita audio: il player
+        # viene fermato e, se riattivata, ri-sincronizzato dalla finestra principale
+        if not checked: self.player.stop()
+        elif self.player.source().isValid(): self.track_loaded.emit(self)
 
     def on_gain_change(self, val):
         self.spin.blockSignals(True); self.spin.setValue(val); self.spin.blockSignals(False)
@@ -294,21 +388,22 @@ class AudioTrackWidget(QFrame):
     def get_db(self): return self.current_db
     
     def sync_play(self):
-        if self.player.source().isValid(): self.player.play()
+        if self.is_active and self.player.source().isValid(): self.player.play()
 
-    def sync_pause(self): self.player.pause()
+    def sync_pause(self):
+        # Solo se sta suonando: una traccia già ferma (o esclusa) non fa un giro nel backend
+        if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState: self.player.pause()
     def sync_stop(self): self.player.stop()
 
     def sync_position(self, ms):
         self.waveform.set_position(ms)
+        if not self.is_active: return
         diff = abs(self.player.position() - ms)
         if diff > 50: self.player.setPosition(ms)
 
     def cleanup(self):
         self.player.stop()
         self.player.setSource(QUrl())
-        try: self.extractor.finished_extraction.disconnect()
-        except: pass
 
 
 # --- VIDEO OVERLAY WIDGET ---
@@ -325,16 +420,31 @@ class VideoOverlay(QWidget):
         self.info_keyframe = 0
         self.info_current_frame = 0
         self.info_total_frames = 0
+        # Il contatore cambia ad ogni tick del player: si ridisegna solo il box, non tutto il video
+        self._info_font = QFont("Consolas", 12, QFont.Weight.Bold)
+        self._info_metrics = QFontMetrics(self._info_font)
+        self._info_rect = QRect()
+        self._feedback_font = QFont("Segoe UI", 20, QFont.Weight.Bold)
         
         self.setMouseTracking(True)
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
         self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents, False)
 
     def update_info(self, key, curr, tot):
+        if (key, curr, tot) == (self.info_keyframe, self.info_current_frame, self.info_total_frames): return
         self.info_keyframe = key
         self.info_current_frame = curr
         self.info_total_frames = tot
-        self.update()
+        # Vecchio e nuovo box insieme: la larghezza del testo può cambiare
+        new_rect = self._info_box_rect()
+        self.update(self._info_rect.united(new_rect).adjusted(-2, -2, 2, 2))
+        self._info_rect = new_rect
+
+    def _info_box_rect(self):
+        text_full = f"({self.info_keyframe}) {self.info_current_frame} / {self.info_total_frames}"
+        text_w = self._info_metrics.horizontalAdvance(text_full) + 20
+        text_h = self._info_metrics.height() + 10
+        return QRect(self.width() - text_w - 20, self.height() - text_h - 20, text_w, text_h)
 
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -356,17 +466,13 @@ class VideoOverlay(QWidget):
 
     def _draw_info_box(self, painter, rect):
         key, curr, tot = self.info_keyframe, self.info_current_frame, self.info_total_frames
-        text_full = f"({key}) {curr} / {tot}"
-        
-        font = QFont("Consolas", 12, QFont.Weight.Bold)
-        painter.setFont(font)
-        metrics = painter.fontMetrics()
         
-        text_w = metrics.horizontalAdvance(text_full) + 20
-        text_h = metrics.height() + 10
+        painter.setFont(self._info_font)
+        metrics = self._info_metrics
         
-        x = rect.width() - text_w - 20
-        y = rect.height() - text_h - 20
+        self._info_rect = self._info_box_rect()
+        x, y = self._info_rect.x(), self._info_rect.y()
+        text_w, text_h = self._info_rect.width(), self._info_rect.height()
         
         painter.setPen(Qt.PenStyle.NoPen)
         painter.setBrush(QColor(0, 0, 0, 180))
@@ -409,8 +515,7 @@ class VideoOverlay(QWidget):
             painter.drawLine(int(cx + off), int(cy - off), int(cx - off), int(cy + off))
 
         painter.setPen(QColor("white"))
-        font = QFont("Segoe UI", 20, QFont.Weight.Bold)
-        painter.setFont(font)
+        painter.setFont(self._feedback_font)
         painter.drawText(QRectF(box_rect.left(), cy + 50, box_w, 40), Qt.AlignmentFlag.AlignCenter, text)
 
     def enterEvent(self, event):
@@ -602,8 +707,21 @@ class MainWindow(QMainWindow):
         self.fps = 30.0
         self.total_frames = 0
         self.keyframes = []
+        self.kf_loader = None
+        self.keyframe_windows = set() # indici delle finestre da WINDOW_SEC già lette
+        self.bg_threads = set() # probe e keyframe ancora in corso, attesi in closeEvent
         self.tracks = []
-        self.temp_dir = tempfile.mkdtemp()
+        self.extractor = None
+        self.probe_cache = {} # (path, mtime, size) -> dati ffprobe
+        self.probe_key = None
+        self.last_track_sync = -1000
+        self.temp_dir = tempfile.mkdtemp(prefix='mixcut_')
+        # Pulizia anche se la finestra non riceve closeEvent (es. uscita da eccezione)
+        atexit.register(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.load_dir = None # sottocartella dei WAV del file corrente
+        self.hwaccel = None
+        self.exporter = None
+        self._cpu_fallback_cmd = None
 
         self.setStyleSheet("""
             QMainWindow { background-color: #2b2b2b; color: #eee; }
@@ -664,6 +782,9 @@ class MainWindow(QMainWindow):
         self.btn_in = create_btn("in.png", QStyle.StandardPixmap.SP_MediaSkipBackward, "[ I ]", self.set_in_point, "I", "Set IN Point")
         self.btn_prev = create_btn("prev.png", QStyle.StandardPixmap.SP_MediaSeekBackward, "<", self.step_back, None, "Previous Frame")
         self.btn_play = create_btn("play.png", QStyle.StandardPixmap.SP_MediaPlay, "Play", self.toggle_play, Qt.Key.Key_Space, "Play/Pause")
+        # Play/pausa si alternano ad ogni cambio di stato del player: icone pronte una volta per tutte
+        self._icon_play = load_custom_icon("play.png", "PLAY", QStyle.StandardPixmap.SP_MediaPlay)
+        self._icon_pause = load_custom_icon("pause.png", "PAUSE", QStyle.StandardPixmap.SP_MediaPause)
         self.btn_next = create_btn("next.png", QStyle.StandardPixmap.SP_MediaSeekForward, ">", self.step_fwd, None, "Next Frame")
         self.btn_out = create_btn("out.png", QStyle.StandardPixmap.SP_MediaSkipForward, "[ O ]", self.set_out_point, "O", "Set OUT Point")
 
@@ -716,15 +837,36 @@ class MainWindow(QMainWindow):
         self.chk_precise = QCheckBox("Precise Cut (Re-encode)")
         self.chk_precise.setChecked(False)
         
+        self.chk_gpu = QCheckBox("GPU Encode (NVENC)")
+        self.chk_gpu.setChecked(False)
+        self.chk_gpu.setEnabled(False)
+        self.chk_gpu.setToolTip("Decode/encode the precise cut on an NVIDIA GPU (falls back to CPU on failure)")
+        
+        self.chk_loudnorm = QCheckBox("Normalize loudness (-16 LUFS)")
+        self.chk_loudnorm.setChecked(False)
+        self.chk_loudnorm.setToolTip("EBU R128 loudnorm on the mix (slower); otherwise dynaudnorm")
+        
         self.btn_export = QPushButton("EXPORT")
         self.btn_export.setFixedHeight(40)
         self.btn_export.setStyleSheet("background-color: #0078d7; font-weight: bold;")
         self.btn_export.clicked.connect(self.export)
         
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setFixedWidth(200)
+        self.progress_bar.setStyleSheet("""
+            QProgressBar { background: #333; border: 1px solid #555; border-radius: 4px; color: white; text-align: center; }
+            QProgressBar::chunk { background-color: #2e7d32; border-radius: 4px; }
+        """)
+        self.progress_bar.hide()
+        
         footer.addWidget(self.chk_precise)
+        footer.addWidget(self.chk_gpu)
+        footer.addWidget(self.chk_loudnorm)
         footer.addSpacing(20)
         footer.addWidget(self.chk_autosave)
         footer.addStretch()
+        footer.addWidget(self.progress_bar)
         footer.addWidget(self.btn_export)
         main_layout.addLayout(footer)
 
@@ -732,13 +874,39 @@ class MainWindow(QMainWindow):
         self.audio_out = QAudioOutput()
         self.player.setAudioOutput(self.audio_out)
         self.player.setVideoOutput(self.video_view.video_item)
-        self.player.positionChanged.connect(self.on_position_changed)
+        self.player.positionChanged.connect(self.on_player_position_changed)
         self.player.durationChanged.connect(self.on_duration_changed)
         self.player.playbackStateChanged.connect(self.update_play_icon)
+        self.player.playbackStateChanged.connect(self.on_playback_state_changed)
+
+        # In riproduzione timeline, overlay e waveform si aggiornano a ~30 Hz campionando
+        # la posizione, qualunque sia la frequenza di positionChanged del backend
+        self.position_timer = QTimer(self)
+        self.position_timer.setInterval(33)
+        self.position_timer.timeout.connect(lambda: self.on_position_changed(self.player.position()))
+
+        # Seek raggruppati: tenendo premuto un tasto di step o trascinando, i seek arrivano più
+        # in fretta di quanto il backend li completi; parte solo l'ultimo ogni 10 ms
+        self.pending_seek = None
+        self.seek_timer = QTimer(self)
+        self.seek_timer.setSingleShot(True)
+        self.seek_timer.setInterval(10)
+        self.seek_timer.timeout.connect(self.apply_pending_seek)
 
     def check_ffmpeg(self):
-        try: subprocess.run([FFMPEG_BIN, '-version'], stdout=subprocess.DEVNULL)
-        except: QMessageBox.critical(self, "Error", "FFmpeg not found!")
+        # Verifica di ffmpeg e ricerca dell'hwaccel in background: la finestra si apre subito,
+        # la checkbox GPU si abilita quando arriva il risultato
+        check = FFmpegCheckThread(self)
+        check.checked.connect(self.on_ffmpeg_checked)
+        check.finished.connect(check.deleteLater)
+        check.start()
+
+    def on_ffmpeg_checked(self, found, hwaccel):
+        if not found:
+            QMessageBox.critical(self, "Error", "FFmpeg not found!")
+            return
+        self.hwaccel = hwaccel
+        self.chk_gpu.setEnabled(hwaccel == 'cuda')
 
     def dragEnterEvent(self, e: QDragEnterEvent):
         if e.mimeData().hasUrls(): e.accept()
@@ -752,63 +920,161 @@ class MainWindow(QMainWindow):
         path, _ = QFileDialog.getOpenFileName(self, "Open Video", "", "Video Files (*.mp4 *.mkv *.mov *.avi)")
         if path: self.load_video(path)
 
+    def stop_extractor(self):
+        if self.extractor:
+            try: self.extractor.signals.finished_extraction.disconnect()
+            except: pass
+            # Termina ffmpeg: non continua a decodificare (e a tenere aperti i WAV) per un file chiuso
+            self.extractor.stop()
+            self.extractor = None
+
+    def clear_temp_tracks(self):
+        # I WAV del file precedente non servono più: la temp dir non cresce ad ogni caricamento.
+        # Va chiamata dopo stop_extractor, quando nessun ffmpeg scrive più nella cartella
+        if self.load_dir:
+            shutil.rmtree(self.load_dir, ignore_errors=True)
+            self.load_dir = None
+
     def close_video(self):
         self.player.stop()
         self.player.setSource(QUrl())
+        self.stop_extractor()
         for t in self.tracks: 
             t.cleanup()
             t.deleteLater()
         self.tracks = []
+        self.clear_temp_tracks()
         self.keyframes = []
+        self.kf_loader = None
+        self.keyframe_windows = set()
+        self.timeline.set_keyframes([])
+        self.seek_timer.stop()
+        self.pending_seek = None
         self.video_path = None
         self.stack.setCurrentIndex(0)
 
     def load_video(self, path):
         self.video_path = path
+        self.last_track_sync = -1000
         
         self.player.setSource(QUrl.fromLocalFile(path))
         self.audio_out.setVolume(0.0) 
         
+        self.stop_extractor()
         for t in self.tracks: 
             t.cleanup()
             t.deleteLater()
         self.tracks = []
+        self.clear_temp_tracks()
         self.stack.setCurrentIndex(1)
         
-        si = subprocess.STARTUPINFO()
-        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        self.keyframes = []
+        self.kf_loader = None
+        self.keyframe_windows = set()
+        self.timeline.set_keyframes([])
+        self.start_keyframe_loader(0)
+
+        self.player.play()
+
+        # Lo stesso file (non modificato) già visto in questa sessione non viene riesaminato
+        try:
+            st = os.stat(path)
+            self.probe_key = (path, st.st_mtime, st.st_size)
+        except OSError: self.probe_key = None
+        if self.probe_key in self.probe_cache:
+            self.on_probe_finished(path, self.probe_cache[self.probe_key])
+            return
+
+        # ffprobe in background: il video parte subito e la UI non si blocca durante il probe
+        probe = ProbeThread(path, self)
+        probe.finished_probe.connect(self.on_probe_finished)
+        probe.probe_error.connect(self.on_probe_error)
+        self.start_bg_thread(probe)
+
+    def start_bg_thread(self, thread):
+        self.bg_threads.add(thread)
+        thread.finished.connect(functools.partial(self.bg_threads.discard, thread))
+        thread.finished.connect(thread.deleteLater)
+        thread.start()
+
+    def on_probe_finished(self, path, data):
+        if path != self.video_path: return
+        if self.probe_key: self.probe_cache[self.probe_key] = data
         try:
-            cmd = [FFPROBE_BIN, '-v', 'quiet', '-print_format', 'json', '-show_streams', path]
-            out = subprocess.check_output(cmd, startupinfo=si)
-            data = json.loads(out)
-            
             v_stream = next((s for s in data['streams'] if s['codec_type'] == 'video'), {})
             if 'r_frame_rate' in v_stream:
                 num, den = map(int, v_stream['r_frame_rate'].split('/'))
                 self.fps = num / den if den > 0 else 30.0
+                # La durata può essere arrivata prima del probe: ricalcola i frame con l'fps giusto
+                if self.duration: self.on_duration_changed(self.duration)
             
             a_streams = [s for s in data['streams'] if s['codec_type'] == 'audio']
+            # Una cartella per caricamento: i WAV non si scontrano mai con quelli del file precedente
+            if a_streams: self.load_dir = tempfile.mkdtemp(dir=self.temp_dir)
             for i, s in enumerate(a_streams):
-                w = AudioTrackWidget(s, i, path, self.temp_dir)
+                w = AudioTrackWidget(s, i, path, self.load_dir)
                 w.track_loaded.connect(self.on_track_sync_request)
                 self.tracks_layout.addWidget(w)
                 self.tracks.append(w)
+
+            # Un solo ffmpeg per tutte le tracce invece di un processo (e un thread) per traccia
+            if self.tracks:
+                try: duration_sec = float(data.get('format', {}).get('duration', 0))
+                except ValueError: duration_sec = 0
+                # Picchi quante le colonne dello schermo, la waveform non è mai più larga
+                peak_target = max(512, self.screen().availableGeometry().width())
+                self.extractor = AudioExtractor(path, [(t.index, t.temp_file) for t in self.tracks], duration_sec, peak_target)
+                self.extractor.signals.finished_extraction.connect(self.on_track_extracted)
+                QThreadPool.globalInstance().start(self.extractor)
                 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error loading: {e}")
-            return
 
-        self.kf_loader = KeyframeLoaderThread(path)
-        self.kf_loader.keyframes_found.connect(self.on_keyframes_loaded)
-        self.kf_loader.start()
+    def on_probe_error(self, path, message):
+        if path != self.video_path: return
+        QMessageBox.critical(self, "Error", f"Error loading: {message}")
 
-        self.player.play()
-
-    def on_keyframes_loaded(self, keyframes):
-        self.keyframes = sorted(keyframes)
+    def start_keyframe_loader(self, window):
+        start_sec = window * KeyframeLoaderThread.WINDOW_SEC
+        self.kf_loader = KeyframeLoaderThread(self.video_path, start_sec, self)
+        self.kf_loader.keyframes_found.connect(self.on_keyframes_loaded)
+        self.start_bg_thread(self.kf_loader)
+
+    def ensure_keyframes_around(self, ms):
+        # I keyframe si caricano a finestre: prima quella che contiene la posizione (un seek
+        # lontano costa una sola lettura), poi la successiva quando ci si avvicina al bordo
+        if self.kf_loader or not self.video_path: return
+        window = int(ms) // KEYFRAME_WINDOW_MS
+        if window not in self.keyframe_windows:
+            self.start_keyframe_loader(window)
+            return
+        next_start = (window + 1) * KEYFRAME_WINDOW_MS
+        if window + 1 not in self.keyframe_windows and ms + KEYFRAME_MARGIN_MS > next_start \
+                and (not self.duration or next_start < self.duration):
+            self.start_keyframe_loader(window + 1)
+
+    def on_keyframes_loaded(self, path, keyframes, start_sec):
+        if path != self.video_path: return
+        self.kf_loader = None
+        self.keyframe_windows.add(int(start_sec) // KeyframeLoaderThread.WINDOW_SEC)
+        if keyframes:
+            # Le finestre arrivano in qualsiasi ordine (seek lontani) e il seek di ffprobe parte dal
+            # keyframe precedente: si fonde solo il tratto che si sovrappone, il resto resta com'è
+            lo = bisect.bisect_left(self.keyframes, keyframes[0])
+            hi = bisect.bisect_right(self.keyframes, keyframes[-1])
+            self.keyframes[lo:hi] = sorted(set(self.keyframes[lo:hi]).union(keyframes))
+        self.timeline.set_keyframes(self.keyframes, self.keyframe_windows)
         self.on_position_changed(self.player.position())
 
+    def on_track_extracted(self, path, idx, peaks, duration_ms):
+        for t in self.tracks:
+            if t.index == int(idx):
+                t.on_ready(path, idx, peaks, duration_ms)
+                break
+
     def on_track_sync_request(self, track_widget):
+        track_widget.waveform.set_position(self.player.position())
+        if not track_widget.is_active: return
         track_widget.player.setPosition(self.player.position())
         if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
             track_widget.player.play()
@@ -822,33 +1088,47 @@ class MainWindow(QMainWindow):
         self.timeline.set_duration(dur)
         self.lbl_out_frame.setText(f"Out: {self.total_frames}")
 
+    def on_playback_state_changed(self, state):
+        if state == QMediaPlayer.PlaybackState.PlayingState: self.position_timer.start()
+        else:
+            self.position_timer.stop()
+            self.on_position_changed(self.player.position())
+
+    def on_player_position_changed(self, pos):
+        # Da fermo (seek, step frame) il timer è spento: aggiorna subito
+        if not self.position_timer.isActive(): self.on_position_changed(pos)
+
     def on_position_changed(self, pos):
         self.timeline.set_position(pos)
+        self.ensure_keyframes_around(pos)
         
         current_frame = int((pos / 1000.0) * self.fps)
         key_frame = 0
         
         if self.keyframes:
-            idx = bisect.bisect_left(self.keyframes, pos)
-            closest_ms = 0
-            if idx == 0: closest_ms = self.keyframes[0]
-            elif idx == len(self.keyframes): closest_ms = self.keyframes[-1]
-            else:
-                before = self.keyframes[idx - 1]
-                after = self.keyframes[idx]
-                closest_ms = before if abs(pos - before) < abs(after - pos) else after
-            
-            key_frame = int((closest_ms / 1000.0) * self.fps)
-            self.timeline.set_nearest_keyframe(closest_ms)
+            # Keyframe più vicino a pos: bisect sulla lista ordinata, a parità vince il successivo
+            i = bisect.bisect_left(self.keyframes, pos)
+            if i == len(self.keyframes): closest_ms = self.keyframes[-1]
+            elif i == 0 or self.keyframes[i] - pos <= pos - self.keyframes[i - 1]: closest_ms = self.keyframes[i]
+            else: closest_ms = self.keyframes[i - 1]
+            # Con finestre non ancora lette tra i due il keyframe trovato non è affidabile
+            if keyframes_cover(self.keyframe_windows, min(pos, closest_ms), max(pos, closest_ms)):
+                key_frame = int((closest_ms / 1000.0) * self.fps)
+                self.timeline.set_nearest_keyframe(closest_ms)
+            else: self.timeline.set_nearest_keyframe(-1)
         
         self.video_view.update_overlay_info(key_frame, current_frame, self.total_frames)
-        for t in self.tracks: t.sync_position(pos)
+        # Sotto i 16 ms (meno di un frame a 60 Hz) cursori e player delle tracce non si muovono:
+        # si risparmia il giro su tutte le tracce
+        if abs(pos - self.last_track_sync) >= 16:
+            self.last_track_sync = pos
+            for t in self.tracks: t.sync_position(pos)
 
     def update_play_icon(self, state):
         if state == QMediaPlayer.PlaybackState.PlayingState:
-            icon, txt = load_custom_icon("pause.png", "PAUSE", QStyle.StandardPixmap.SP_MediaPause)
+            icon, txt = self._icon_pause
         else:
-            icon, txt = load_custom_icon("play.png", "PLAY", QStyle.StandardPixmap.SP_MediaPlay)
+            icon, txt = self._icon_play
         
         if not icon.isNull():
             self.btn_play.setIcon(icon)
@@ -866,19 +1146,35 @@ class MainWindow(QMainWindow):
             for t in self.tracks: t.sync_play()
 
     def seek_all(self, ms):
-        self.player.setPosition(ms)
-        for t in self.tracks: t.player.setPosition(ms)
-
-    def step_fwd(self):
+        self.pending_seek = ms
+        if not self.seek_timer.isActive(): self.seek_timer.start()
+
+    def apply_pending_seek(self):
+        ms, self.pending_seek = self.pending_seek, None
+        if ms is None: return
+        if self.player.position() != ms: self.player.setPosition(ms)
+        for t in self.tracks:
+            if t.is_active and abs(t.player.position() - ms) > 1: t.player.setPosition(ms)
+
+    def current_target_position(self):
+        # Gli step consecutivi partono dal seek ancora in coda, non dalla posizione vecchia del player
+        return self.pending_seek if self.pending_seek is not None else self.player.position()
+
+    def pause_all(self):
+        # Tra due step il video è già in pausa: niente pause() su player e tracce.
+        # Da fermo invece serve, è la pausa che mostra il frame
+        if self.player.playbackState() == QMediaPlayer.PlaybackState.PausedState: return
         self.player.pause()
         for t in self.tracks: t.sync_pause()
-        new_pos = self.player.position() + int(1000/self.fps)
+
+    def step_fwd(self):
+        self.pause_all()
+        new_pos = self.current_target_position() + int(1000/self.fps)
         self.seek_all(new_pos)
 
     def step_back(self):
-        self.player.pause()
-        for t in self.tracks: t.sync_pause()
-        new_pos = self.player.position() - int(1000/self.fps)
+        self.pause_all()
+        new_pos = self.current_target_position() - int(1000/self.fps)
         self.seek_all(new_pos)
 
     def set_in_point(self): 
@@ -917,16 +1213,38 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "No active tracks.")
             return
 
-        self.player.pause()
-        for t in self.tracks: t.sync_pause()
+        self.pause_all()
+
+        use_gpu = self.chk_precise.isChecked() and self.chk_gpu.isChecked() and self.hwaccel == 'cuda'
+        cmd = self.build_export_cmd(ss, to, active, out_path, use_gpu)
+        self._cpu_fallback_cmd = self.build_export_cmd(ss, to, active, out_path, False) if use_gpu else None
 
-        cmd = [FFMPEG_BIN, '-y', '-ss', ss, '-to', to, '-i', self.video_path]
+        self.btn_export.setEnabled(False); self.btn_export.setText("EXPORTING...")
+        self.progress_bar.setValue(0); self.progress_bar.show()
+        self.start_export_thread(cmd, duration_ms / 1000.0)
+
+    def build_export_cmd(self, ss, to, active, out_path, use_gpu):
+        cmd = [FFMPEG_BIN, '-y', '-nostats', '-progress', 'pipe:1', *FILTER_THREAD_ARGS]
+        if use_gpu:
+            # Decode su NVDEC con frame che restano in memoria GPU fino a NVENC (va messo prima di -i)
+            cmd.extend(['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda'])
+        elif self.chk_precise.isChecked():
+            # Re-encode su CPU: thread espliciti sia per il decoder (prima di -i) sia per libx264
+            cmd.extend(['-threads', '0'])
+        cmd.extend(['-ss', ss, '-to', to, '-i', self.video_path])
         
-        if self.chk_precise.isChecked():
-            cmd.extend(['-map', '0:v', '-c:v', 'libx264', '-crf', '18', '-preset', 'fast'])
+        if use_gpu:
+            cmd.extend(['-map', '0:v', '-c:v', 'h264_nvenc', '-preset', 'p4', '-cq', '18'])
+        elif self.chk_precise.isChecked():
+            cmd.extend(['-map', '0:v', '-c:v', 'libx264', '-crf', '18', '-preset', 'fast', '-threads', '0'])
         else:
             cmd.extend(['-map', '0:v', '-c:v', 'copy'])
         
+        # Una sola traccia a 0 dB con codec accettato dall'MP4: remux dell'audio, niente decode/encode
+        if len(active) == 1 and active[0].get_db() == 0 and active[0].codec in MP4_COPY_AUDIO_CODECS:
+            cmd.extend(['-map', f'0:a:{active[0].index}', '-c:a', 'copy', out_path])
+            return cmd
+
         filter_parts = []
         mix_ins = ""
         for i, t in enumerate(active):
@@ -934,20 +1252,47 @@ class MainWindow(QMainWindow):
             filter_parts.append(f"[0:a:{t.index}]volume={db}dB[a{i}]")
             mix_ins += f"[a{i}]"
         
-        complex_filter = f"{';'.join(filter_parts)};{mix_ins}amix=inputs={len(active)}[outa];[outa]dynaudnorm[a_final]"
+        if self.chk_loudnorm.isChecked():
+            # EBU R128 a -16 LUFS come Audio Merge: amix senza normalize, l'unica correzione è loudnorm,
+            # che esce a 192 kHz (si torna a 48 kHz per l'AAC)
+            mix = f"amix=inputs={len(active)}:normalize=0,loudnorm=I=-16:LRA=11:TP=-1.5,aresample=48000[a_final]"
+        else:
+            mix = f"amix=inputs={len(active)}[outa];[outa]dynaudnorm[a_final]"
+        complex_filter = f"{';'.join(filter_parts)};{mix_ins}{mix}"
         cmd.extend(['-filter_complex', complex_filter, '-map', '[a_final]', '-c:a', 'aac', '-b:a', '192k', out_path])
-
-        self.btn_export.setEnabled(False); self.btn_export.setText("EXPORTING...")
-        self.exporter = ExportThread(cmd, duration_ms / 1000.0)
+        return cmd
+
+    def start_export_thread(self, cmd, duration_sec):
+        self.export_duration = duration_sec
+        if self.exporter:
+            # Il fallback CPU parte dallo slot del thread precedente, che può essere ancora
+            # in uscita da run(): si attende prima di perderne l'ultimo riferimento
+            self.exporter.wait()
+            self.exporter.deleteLater()
+        self.exporter = ExportThread(cmd, duration_sec)
+        self.exporter.progress_update.connect(self.progress_bar.setValue)
         self.exporter.finished.connect(self.on_export_done)
         self.exporter.start()
 
     def on_export_done(self, success, msg):
+        if not success and self._cpu_fallback_cmd:
+            # CUDA/NVENC non utilizzabile su questa macchina: ripete l'export su CPU
+            cmd, self._cpu_fallback_cmd = self._cpu_fallback_cmd, None
+            self.progress_bar.setValue(0)
+            self.start_export_thread(cmd, self.export_duration)
+            return
+        self._cpu_fallback_cmd = None
+        self.progress_bar.hide()
         self.btn_export.setEnabled(True); self.btn_export.setText("EXPORT")
         if success: QMessageBox.information(self, "Done", msg)
         else: QMessageBox.critical(self, "Error", msg)
 
     def closeEvent(self, e):
+        if self.exporter and self.exporter.isRunning():
+            self.exporter.stop()
+            self.exporter.wait()
+        self.stop_extractor()
+        for t in list(self.bg_threads): t.wait()
         shutil.rmtree(self.temp_dir, ignore_errors=True)
         e.accept()
 
@@ -957,6 +1302,8 @@ if __name__ == '__main__':
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
     app = QApplication(sys.argv)
+    # Ogni task del pool lancia un ffmpeg già multi-thread: metà dei core basta
+    QThreadPool.globalInstance().setMaxThreadCount(max(2, (os.cpu_count() or 2) // 2))
     
     # 2. Imposta l'icona globale dell'applicazione
     icon_path = resource_path("app_icon.ico")
@@ -2,20 +2,21 @@ import sys
 import os
 import json
 import subprocess
-import tempfile
 import shutil
-import wave
-import struct
+import array
 import math
 import re
+import hashlib
+import time
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QPushButton, QCheckBox, 
                              QScrollArea, QFileDialog, QMessageBox, QFrame, 
                              QSizePolicy, QSlider, QDoubleSpinBox)
-from PyQt6.QtCore import Qt, QUrl, pyqtSignal, QThread, QSize, QEvent, QRect
+from PyQt6.QtCore import (Qt, QUrl, pyqtSignal, QThread, QSize, QEvent, QRect, 
+                          QObject, QRunnable, QThreadPool, QLine, QTimer, QBuffer, QIODevice)
 from PyQt6.QtGui import (QDragEnterEvent, QDropEvent, QPainter, QColor, QPen, 
-                         QIcon, QCursor, QBrush, QPainterPath)
+                         QIcon, QCursor, QBrush, QPainterPath, QPixmap)
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 
 # --- RISORSE ESTERNE ---
@@ -30,39 +31,250 @@ def get_ffmpeg_path(exe_name):
 FFMPEG_BIN = get_ffmpeg_path("ffmpeg.exe")
 FFPROBE_BIN = get_ffmpeg_path("ffprobe.exe")
 
-# --- UTILS ---
-def time_str_to_seconds(time_str):
+# Picchi per traccia di default; all'apertura si usa la larghezza dello schermo
+PEAK_BINS = 4096
+
+WAVEFORM_RATE = 8000
+
+def compute_peaks(samples, target_width=PEAK_BINS):
+    """Riduce una sequenza di campioni int16 a ~target_width picchi, sempre int16 (0..32767)"""
+    # array('h'): 2 byte per picco invece di un float Python; la scala a 0..1 si applica al disegno
+    count = len(samples)
+    step = max(1, count // target_width)
+    peaks = array.array('h')
+    for i in range(0, count, step):
+        chunk = samples[i:i+step]
+        if len(chunk):
+            peaks.append(min(32767, max(max(chunk), -min(chunk))))
+    return peaks
+
+# --- CACHE PICCHI SU DISCO ---
+# Riaprendo lo stesso file in una sessione successiva la waveform si legge da qui (pochi KB
+# per traccia) invece di rilanciare ffmpeg. Path, mtime e dimensione sono nel nome: un file
+# modificato produce semplicemente un'altra voce.
+PEAKS_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'audiomerge')
+PEAKS_CACHE_MAX_AGE = 30 * 86400         # s dall'ultimo uso
+PEAKS_CACHE_MAX_BYTES = 20 * 1024 * 1024 # oltre, si eliminano le voci usate meno di recente
+
+def peaks_cache_path(key, track_index):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return os.path.join(PEAKS_CACHE_DIR, f"{digest}_{track_index}.peaks")
+
+def load_cached_peaks(key, track_index):
+    """Ritorna (picchi, durata ms) dalla cache su disco, None se assente o illeggibile"""
     try:
-        parts = time_str.split(':')
-        return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
-    except:
-        return 0.0
+        path = peaks_cache_path(key, track_index)
+        with open(path, 'rb') as f: data = f.read()
+        header = array.array('d'); header.frombytes(data[:8])
+        peaks = array.array('h'); peaks.frombytes(data[8:])
+        if not peaks: return None
+        os.utime(path) # mtime = ultimo uso, per la pulizia
+        return peaks, header[0]
+    except: return None
 
-# --- THREAD ESTRAZIONE ---
-class AudioExtractorThread(QThread):
-    finished_extraction = pyqtSignal(str, str)
+def save_cached_peaks(key, track_index, peaks, duration_ms):
+    if not peaks: return # una waveform vuota (ffmpeg fallito) non va mai resa permanente
+    try:
+        os.makedirs(PEAKS_CACHE_DIR, exist_ok=True)
+        with open(peaks_cache_path(key, track_index), 'wb') as f:
+            array.array('d', [duration_ms]).tofile(f)
+            peaks.tofile(f)
+    except: pass
 
-    def __init__(self, input_video, track_index, output_path):
+def prune_peaks_cache():
+    """Elimina le voci non usate da PEAKS_CACHE_MAX_AGE e, oltre PEAKS_CACHE_MAX_BYTES, le meno recenti"""
+    try:
+        entries = []
+        for e in os.scandir(PEAKS_CACHE_DIR):
+            if e.name.endswith('.peaks'):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+    except OSError: return
+    now, total = time.time(), 0
+    for mtime, size, path in sorted(entries, reverse=True):
+        total += size
+        if now - mtime > PEAKS_CACHE_MAX_AGE or total > PEAKS_CACHE_MAX_BYTES:
+            try: os.remove(path)
+            except OSError: pass
+
+# --- CALCOLO WAVEFORM (THREAD POOL) ---
+class WaveformSignals(QObject):
+    peaks_ready = pyqtSignal(int, object, float) # indice traccia, picchi, durata ms
+    failed = pyqtSignal(str) # messaggio, vale per tutte le tracce dell'estrazione
+
+class WaveformExtractor(QRunnable):
+    def __init__(self, input_video, track_indices, peak_target=PEAK_BINS, duration_sec=0):
+        """Decodifica tutte le tracce con un solo ffmpeg in PCM s16le su pipe: nessun WAV su disco"""
         super().__init__()
+        self.signals = WaveformSignals()
+        self.input_video = input_video
+        self.track_indices = track_indices
+        self.peak_target = peak_target
+        # La waveform copre al massimo i primi 30 s, come l'anteprima
+        self.length_sec = min(30.0, duration_sec) if duration_sec > 0 else 30.0
+        self.pad = duration_sec > 0
+
+    def run(self):
+        si = subprocess.STARTUPINFO()
+        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        n = len(self.track_indices)
+        cmd = [FFMPEG_BIN, '-nostats', '-v', 'error', '-i', self.input_video]
+        if n == 1:
+            cmd.extend(['-map', f'0:a:{self.track_indices[0]}', '-ac', '1', '-ar', str(WAVEFORM_RATE)])
+        else:
+            # Ogni traccia diventa un canale mono dello stesso stream (pad fino a length_sec): un'unica pipe interleaved
+            pad = f",apad=whole_dur={self.length_sec}" if self.pad else ""
+            parts = [f"[0:a:{idx}]aformat=sample_rates={WAVEFORM_RATE}:channel_layouts=mono{pad}[w{i}]"
+                     for i, idx in enumerate(self.track_indices)]
+            labels = "".join(f"[w{i}]" for i in range(n))
+            cmd.extend(['-filter_complex', f"{';'.join(parts)};{labels}amerge=inputs={n}[wav]", '-map', '[wav]'])
+        cmd.extend(['-t', str(self.length_sec), '-f', 's16le', '-'])
+
+        try:
+            try:
+                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=si)
+            except FileNotFoundError:
+                cmd[0] = 'ffmpeg'
+                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=si)
+            raw = result.stdout
+            if result.returncode != 0 or not raw:
+                self.signals.failed.emit(f"Waveform load error: ffmpeg exit code {result.returncode}")
+                return
+            samples = array.array('h')
+            samples.frombytes(raw[:len(raw) - len(raw) % (2 * n)])
+            del raw
+            if sys.byteorder == 'big': samples.byteswap()
+        except Exception as e:
+            self.signals.failed.emit(f"Waveform load error: {e}")
+            return
+
+        duration_ms = (len(samples) / n / WAVEFORM_RATE) * 1000
+        for i, idx in enumerate(self.track_indices):
+            # De-interleave: lo slice con passo n estrae il canale i in C
+            channel = samples[i::n] if n > 1 else samples
+            self.signals.peaks_ready.emit(idx, compute_peaks(channel, self.peak_target), duration_ms)
+
+# --- ESTRAZIONE (THREAD POOL) ---
+def fix_wav_sizes(data):
+    """Su pipe ffmpeg non può tornare indietro a scrivere le dimensioni RIFF/data: si correggono qui"""
+    if not data.startswith(b'RIFF'): return data
+    buf = bytearray(data)
+    buf[4:8] = (len(buf) - 8).to_bytes(4, 'little')
+    pos = 12
+    while pos + 8 <= len(buf):
+        chunk_id, size = bytes(buf[pos:pos+4]), int.from_bytes(buf[pos+4:pos+8], 'little')
+        if chunk_id == b'data':
+            buf[pos+4:pos+8] = (len(buf) - pos - 8).to_bytes(4, 'little')
+            break
+        pos += 8 + size + (size & 1)
+    return bytes(buf)
+
+class ExtractorSignals(QObject):
+    finished_extraction = pyqtSignal(str, object) # index, WAV in memoria (bytes, vuoto se fallita)
+
+class AudioExtractor(QRunnable):
+    def __init__(self, input_video, track_index, sample_rate=44100):
+        """Anteprima di 30 s della traccia come WAV in memoria: niente file temporanei su disco"""
+        super().__init__()
+        self.signals = ExtractorSignals()
         self.input_video = input_video
         self.track_index = track_index
-        self.output_path = output_path
+        self.sample_rate = sample_rate
 
     def run(self):
         si = subprocess.STARTUPINFO()
         si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        cmd = [
-            FFMPEG_BIN, '-y', '-i', self.input_video,
-            '-map', f'0:a:{self.track_index}',
-            '-t', '30', '-ac', '1', '-ar', '44100', '-f', 'wav', 
-            self.output_path
-        ]
+        # -threads 1: più anteprime possono girare insieme nel pool, ognuna resta su un core
+        cmd = [FFMPEG_BIN, '-nostats', '-v', 'error', '-threads', '1', '-i', self.input_video, '-map', f'0:a:{self.track_index}',
+               '-t', '30', '-ac', '1', '-ar', str(self.sample_rate), '-threads', '1', '-f', 'wav', 'pipe:1']
         try:
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
+            data = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=si).stdout
         except FileNotFoundError:
             cmd[0] = 'ffmpeg'
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
-        self.finished_extraction.emit(self.output_path, str(self.track_index))
+            data = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=si).stdout
+        self.signals.finished_extraction.emit(str(self.track_index), fix_wav_sizes(data))
+
+# --- THREAD VERIFICA FFMPEG ---
+class FFmpegCheckThread(QThread):
+    checked = pyqtSignal(bool) # True se ffmpeg (bundle o PATH) si avvia
+
+    def run(self):
+        si = subprocess.STARTUPINFO()
+        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        for binary in (FFMPEG_BIN, 'ffmpeg'):
+            try:
+                subprocess.run([binary, '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
+                self.checked.emit(True)
+                return
+            except FileNotFoundError: pass
+        self.checked.emit(False)
+
+# --- THREAD PROBE ---
+class ProbeThread(QThread):
+    finished_probe = pyqtSignal(str, object) # path, dati ffprobe
+    probe_error = pyqtSignal(str, str) # path, messaggio
+
+    def __init__(self, video_path, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+
+    def run(self):
+        si = subprocess.STARTUPINFO()
+        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        # Solo i campi usati dalla UI: il JSON resta piccolo anche con molte tracce/tag
+        cmd = [FFPROBE_BIN, '-v', 'quiet', '-print_format', 'json', '-select_streams', 'a',
+               '-show_entries', 'format=duration:stream=codec_name:stream_tags=language,title', self.video_path]
+        try:
+            try:
+                output = subprocess.check_output(cmd, startupinfo=si)
+            except FileNotFoundError:
+                cmd[0] = 'ffprobe'
+                output = subprocess.check_output(cmd, startupinfo=si)
+            self.finished_probe.emit(self.video_path, json.loads(output))
+        except Exception as e:
+            self.probe_error.emit(self.video_path, str(e))
+
+# Codec audio copiabili senza ricodifica per container di destinazione
+COPY_AUDIO_CODECS = {
+    '.mp4': {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus', 'flac'},
+    '.mov': {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'pcm_s16le', 'pcm_s24le'},
+    '.mkv': None,
+}
+
+FILTER_THREAD_ARGS = ['-filter_complex_threads', str(max(2, (os.cpu_count() or 2) // 2))]
+
+# --- THREAD MISURA LOUDNESS ---
+LOUDNESS_TARGET = -16.0   # LUFS integrati
+LOUDNESS_TOLERANCE = 2.0  # LU: entro questa banda non si applica nessuna correzione
+
+class LoudnessThread(QThread):
+    finished_measure = pyqtSignal(object, str) # loudness integrata in LUFS (None se non misurabile), errore
+
+    def __init__(self, cmd, parent=None):
+        super().__init__(parent)
+        self.cmd = cmd
+        self.process = None
+        self.is_running = True
+
+    def run(self):
+        si = subprocess.STARTUPINFO()
+        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        try:
+            self.process = subprocess.Popen(self.cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                            encoding='utf-8', errors='replace', startupinfo=si)
+            # stop() arrivato prima che il processo esistesse
+            if not self.is_running: self.process.terminate()
+            _, stderr = self.process.communicate()
+            # Il riepilogo di ebur128 chiude lo stderr: "I:  -19.3 LUFS"
+            values = re.findall(r"I:\s+(-?\d+(?:\.\d+)?) LUFS", stderr) if self.is_running else []
+            self.finished_measure.emit(float(values[-1]) if values else None, "")
+        except Exception as e:
+            self.finished_measure.emit(None, str(e))
+
+    def stop(self):
+        self.is_running = False
+        if self.process:
+            self.process.terminate()
 
 # --- THREAD ESPORTAZIONE ---
 class ExportThread(QThread):
@@ -89,18 +301,22 @@ class ExportThread(QThread):
                 errors='replace',
                 startupinfo=si
             )
-            time_pattern = re.compile(r"time=(\d{2}:\d{2}:\d{2}\.\d{2})")
+            # Il comando usa '-progress pipe:1 -nostats': righe key=value, out_time_us in microsecondi
+            last_percent = -1
             for line in self.process.stdout:
-                if not self.is_running:
-                    self.process.terminate()
-                    return
-                match = time_pattern.search(line)
-                if match and self.total_duration > 0:
-                    current_seconds = time_str_to_seconds(match.group(1))
-                    percent = int((current_seconds / self.total_duration) * 100)
-                    self.progress_update.emit(min(99, percent))
+                if not self.is_running: break
+                if line.startswith('out_time_us=') and self.total_duration > 0:
+                    try: current_seconds = int(line[12:]) / 1_000_000
+                    except ValueError: continue # "N/A" finché non parte l'encode
+                    percent = max(0, min(99, int((current_seconds / self.total_duration) * 100)))
+                    # Segnale (e repaint del bottone) solo quando la percentuale cambia davvero
+                    if percent != last_percent:
+                        last_percent = percent
+                        self.progress_update.emit(percent)
             self.process.wait()
-            if self.process.returncode == 0:
+            if not self.is_running:
+                self.finished.emit(False, "Export cancelled.")
+            elif self.process.returncode == 0:
                 self.progress_update.emit(100)
                 self.finished.emit(True, "Export completed!")
             else:
@@ -124,6 +340,7 @@ class ProgressButton(QPushButton):
         self.setFixedHeight(50)
 
     def set_progress(self, val):
+        if val == self.progress: return
         self.progress = val
         self.update()
 
@@ -182,40 +399,49 @@ class WaveformWidget(QWidget):
         self.duration_ms = 0
         self.current_position_ms = 0
         self.is_loaded = False
+        self.error_text = ""
         self.gain_linear = 1.0 
+        self._wave_pixmap = None
+        self._cursor_pen = QPen(QColor("#ff4081"), 2) # creata una volta, non ad ogni repaint
+        self._wave_pen = QPen(QColor("#00bcd4"), 1)
+        self._bg_color = QColor("#1e1e1e")
         self.setStyleSheet("background-color: #222; border: 1px solid #444;")
 
     def set_gain_db(self, db_value):
-        self.gain_linear = 10 ** (db_value / 20.0)
+        gain = 10 ** (db_value / 20.0)
+        if gain == self.gain_linear and self._wave_pixmap is not None: return
+        self.gain_linear = gain
+        self._wave_pixmap = None
         self.update()
 
-    def load_audio_data(self, file_path):
-        if not os.path.exists(file_path): return
-        try:
-            with wave.open(file_path, 'r') as wf:
-                self.n_frames = wf.getnframes()
-                self.framerate = wf.getframerate()
-                self.duration_ms = (self.n_frames / self.framerate) * 1000
-                raw_data = wf.readframes(self.n_frames)
-                count = len(raw_data) // 2
-                fmt = f"<{count}h" 
-                raw_samples = struct.unpack(fmt, raw_data)
-                
-                target_width = 2000 
-                step = max(1, count // target_width)
-                self.samples = []
-                for i in range(0, count, step):
-                    chunk = raw_samples[i:i+step]
-                    if chunk:
-                        val = max(abs(x) for x in chunk) / 32768.0
-                        self.samples.append(val)
-                self.is_loaded = True
-                self.update()
-        except: pass
+    def set_peaks(self, peaks, duration_ms):
+        self.samples = peaks
+        self.duration_ms = duration_ms
+        self.is_loaded = True
+        self.error_text = ""
+        self._wave_pixmap = None
+        self.update()
+
+    def set_error(self, message):
+        # Estrazione fallita: il messaggio prende il posto della waveform
+        self.error_text = message
+        self.setToolTip(message)
+        self._wave_pixmap = None
+        self.update()
+
+    def _cursor_x(self, ms):
+        if self.duration_ms <= 0: return 0
+        return int((ms / self.duration_ms) * self.width())
 
     def set_position(self, ms):
+        old_x = self._cursor_x(self.current_position_ms)
         self.current_position_ms = ms
-        self.update()
+        new_x = self._cursor_x(ms)
+        if new_x == old_x: return
+        # Ridisegna solo le due strisce del cursore: la waveform sta nel pixmap in cache
+        h = self.height()
+        self.update(QRect(old_x - 2, 0, 4, h))
+        self.update(QRect(new_x - 2, 0, 4, h))
 
     def _handle_input(self, x):
         if not self.is_loaded or self.duration_ms == 0: return
@@ -229,46 +455,82 @@ class WaveformWidget(QWidget):
     def mouseMoveEvent(self, event):
         if event.buttons() & Qt.MouseButton.LeftButton: self._handle_input(event.pos().x())
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        painter.fillRect(self.rect(), QColor("#1e1e1e"))
-        if not self.is_loaded or not self.samples: return
-        rect_w, rect_h, mid_h = self.width(), self.height(), self.height() / 2
-        total = len(self.samples)
-        step = total / rect_w
-        
-        pen_color = QColor("#00bcd4")
-        if self.gain_linear > 1.0:
-            pen_color = QColor("#00bcd4") 
+    def resizeEvent(self, event):
+        self._wave_pixmap = None
+        super().resizeEvent(event)
 
-        painter.setPen(QPen(pen_color, 1))
-        
+    def _compute_bars(self, rect_w, rect_h):
+        """Riduce i picchi a una colonna per pixel (max del bucket) e restituisce una QLine verticale per colonna."""
+        total = len(self.samples)
+        mid_h = rect_h / 2
+        scale = self.gain_linear / 32768.0
+        bars = []
         for x in range(rect_w):
-            idx = int(x * step)
-            if idx >= total: break
-            
-            val = self.samples[idx] * self.gain_linear
+            start = x * total // rect_w
+            end = max(start + 1, (x + 1) * total // rect_w)
+            if start >= total: break
+            # max() sulla slice gira in C: una sola chiamata Python per colonna
+            val = max(self.samples[start:end]) * scale
             if val > 1.0: val = 1.0
-            
             bar_h = val * (rect_h - 4)
-            painter.drawLine(int(x), int(mid_h - bar_h/2), int(x), int(mid_h + bar_h/2))
+            bars.append(QLine(x, int(mid_h - bar_h/2), x, int(mid_h + bar_h/2)))
+        return bars
+
+    def _render_waveform_pixmap(self):
+        """Disegna sfondo e barre in un pixmap: cambia solo con dimensione, audio o gain."""
+        rect_w, rect_h = self.width(), self.height()
+        pixmap = QPixmap(self.size())
+        pixmap.fill(self._bg_color)
+        if self.error_text:
+            painter = QPainter(pixmap)
+            painter.setPen(QColor("#ff5252"))
+            painter.drawText(pixmap.rect(), Qt.AlignmentFlag.AlignCenter, self.error_text)
+            painter.end()
+            return pixmap
+        if not self.is_loaded or not self.samples: return pixmap
+
+        # Barre verticali da 1px su coordinate intere: l'antialiasing non cambia il risultato, costa e basta
+        painter = QPainter(pixmap)
+
+        painter.setPen(self._wave_pen)
+        
+        # Una sola chiamata per tutte le barre invece di un drawLine per colonna
+        painter.drawLines(self._compute_bars(rect_w, rect_h))
+        painter.end()
+        return pixmap
+
+    def paintEvent(self, event):
+        if self._wave_pixmap is None or self._wave_pixmap.size() != self.size():
+            self._wave_pixmap = self._render_waveform_pixmap()
+
+        painter = QPainter(self)
+        # Si copia solo la regione sporca (di solito le strisce del cursore)
+        dirty = event.rect()
+        painter.drawPixmap(dirty, self._wave_pixmap, dirty)
+        if not self.is_loaded or not self.samples: return
             
         if self.duration_ms > 0:
-            cx = (self.current_position_ms / self.duration_ms) * rect_w
-            painter.setPen(QPen(QColor("#ff4081"), 2))
-            painter.drawLine(int(cx), 0, int(cx), rect_h)
+            cx = self._cursor_x(self.current_position_ms)
+            painter.setPen(self._cursor_pen)
+            painter.drawLine(cx, 0, cx, self.height())
 
 # --- TRACK WIDGET ---
 class AudioTrackWidget(QFrame):
-    def __init__(self, track_info, index, file_path, temp_dir):
+    play_requested = pyqtSignal(object) # traccia
+    volume_changed = pyqtSignal(object) # traccia
+    seek_requested = pyqtSignal(object, int) # traccia, ms
+
+    def __init__(self, track_info, index, file_path):
         super().__init__()
         self.setFrameShape(QFrame.Shape.StyledPanel)
         self.track_info = track_info
         self.index = index
         self.file_path = file_path
-        self.temp_dir = temp_dir
-        self.temp_file = os.path.join(temp_dir, f"preview_{self.index}.wav")
+        self.extractor = None
+        self.preview_buffer = None # QBuffer con il WAV di anteprima, sorgente diretta del player
+        self.preview_ready = False
+        self.preview_volume = 0.25
+        self.seek_position = None # seek chiesto mentre la traccia non era nel player
         
         self.setFixedHeight(110)
         
@@ -294,7 +556,6 @@ class AudioTrackWidget(QFrame):
         self.play_btn.setFixedSize(30, 30)
         self.play_btn.setStyleSheet("font-weight: bold; font-size: 14px;")
         self.play_btn.clicked.connect(self.toggle_playback)
-        self.play_btn.setEnabled(False)
         top_row.addWidget(self.play_btn)
         
         lang = track_info.get('tags', {}).get('language', 'unk')
@@ -350,17 +611,6 @@ class AudioTrackWidget(QFrame):
         
         self.main_layout.addWidget(right_container)
 
-        # PLAYER
-        self.player = QMediaPlayer()
-        self.audio_output = QAudioOutput()
-        self.player.setAudioOutput(self.audio_output)
-        self.player.playbackStateChanged.connect(self.on_state_changed)
-        self.player.positionChanged.connect(self.on_position_changed)
-        
-        self.extractor = AudioExtractorThread(file_path, index, self.temp_file)
-        self.extractor.finished_extraction.connect(self.on_extraction_finished)
-        self.extractor.start()
-
     # --- FIX: VOLUME CON MAGGIORE HEADROOM ---
     def update_realtime_volume(self, db_val):
         """
@@ -371,8 +621,9 @@ class AudioTrackWidget(QFrame):
         """
         HEADROOM_FACTOR = 0.25  # 0dB = 25% volume. Max boost udibile = +12dB.
         linear_volume = (10 ** (db_val / 20.0)) * HEADROOM_FACTOR
-        self.audio_output.setVolume(min(1.0, linear_volume))
+        self.preview_volume = min(1.0, linear_volume)
         self.waveform.set_gain_db(db_val)
+        self.volume_changed.emit(self)
 
     def on_slider_change(self, val):
         self.db_spin.blockSignals(True)
@@ -389,29 +640,39 @@ class AudioTrackWidget(QFrame):
     def get_current_db(self):
         return self.db_spin.value()
 
-    def on_extraction_finished(self, path, idx):
-        if os.path.exists(path):
-            self.play_btn.setEnabled(True)
-            self.waveform.load_audio_data(path)
-            self.player.setSource(QUrl.fromLocalFile(path))
-            current_db = self.db_spin.value()
-            self.update_realtime_volume(current_db)
+    def start_preview_extraction(self):
+        # L'anteprima a 44.1 kHz viene estratta solo al primo ascolto della traccia.
+        # Il pool limita i processi ffmpeg concorrenti ai core disponibili e ricicla i thread.
+        self.play_btn.setEnabled(False)
+        self.play_btn.setText("…")
+        self.extractor = AudioExtractor(self.file_path, self.index)
+        self.extractor.signals.finished_extraction.connect(self.on_extraction_finished)
+        QThreadPool.globalInstance().start(self.extractor)
+
+    def on_extraction_finished(self, idx, data):
+        self.extractor = None
+        self.play_btn.setEnabled(True)
+        self.play_btn.setText("▶")
+        if data:
+            self.preview_buffer = QBuffer(self)
+            self.preview_buffer.setData(data)
+            self.preview_buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+            self.preview_ready = True
+            self.play_requested.emit(self)
 
     def toggle_playback(self):
-        if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
-            self.player.pause()
-        else: self.player.play()
+        if not self.preview_ready:
+            self.start_preview_extraction()
+        else: self.play_requested.emit(self)
 
-    def on_state_changed(self, state):
-        self.play_btn.setText("⏸" if state == QMediaPlayer.PlaybackState.PlayingState else "▶")
+    def set_playing(self, playing):
+        self.play_btn.setText("⏸" if playing else "▶")
     
-    def on_position_changed(self, position): self.waveform.set_position(position)
-    def seek_audio(self, ms): self.player.setPosition(ms)
+    def seek_audio(self, ms): self.seek_requested.emit(self, ms)
     def cleanup(self):
-        self.player.stop()
-        self.player.setSource(QUrl())
-        try: self.extractor.finished_extraction.disconnect()
-        except: pass
+        if self.extractor:
+            try: self.extractor.signals.finished_extraction.disconnect()
+            except: pass
 
 # --- DROP SECTION ---
 class DropSection(QWidget):
@@ -474,8 +735,28 @@ class MainWindow(QMainWindow):
         self.current_video_path = None
         self.video_duration = 0
         self.track_widgets = []
-        self.temp_dir = tempfile.mkdtemp()
         self.export_thread = None
+        self.loudness_thread = None
+        self.pending_export = None
+        self.extractor = None
+        self.probe_cache = {} # (path, mtime, size) -> dati ffprobe
+        self.probe_key = None
+        self.peaks_cache = {} # (probe_key, indice traccia) -> (picchi, durata ms), pochi KB per traccia
+        prune_peaks_cache()
+        
+        # PLAYER CONDIVISO: un solo decoder e una sola uscita audio per tutte le tracce
+        self.player = QMediaPlayer()
+        self.audio_output = QAudioOutput()
+        self.player.setAudioOutput(self.audio_output)
+        self.player.playbackStateChanged.connect(self.on_player_state_changed)
+        self.player.positionChanged.connect(self.on_player_position_changed)
+        self.player.mediaStatusChanged.connect(self.on_media_status_changed)
+        self.active_track = None
+        # positionChanged arriva al ritmo del backend: il cursore si aggiorna al massimo a ~30 Hz
+        self.pending_position = None
+        self.cursor_timer = QTimer(self)
+        self.cursor_timer.setInterval(33)
+        self.cursor_timer.timeout.connect(self.flush_cursor_position)
         
         self.setStyleSheet("QMainWindow { background-color: #2b2b2b; } QLabel, QCheckBox { color: #e0e0e0; } QScrollArea { border: none; background-color: #2b2b2b; }")
         
@@ -502,34 +783,62 @@ class MainWindow(QMainWindow):
         export_layout = QVBoxLayout()
         export_layout.setContentsMargins(10, 10, 10, 0)
         
+        export_row = QHBoxLayout()
         self.export_btn = ProgressButton("EXPORT")
         self.export_btn.clicked.connect(self.start_export)
         self.export_btn.setEnabled(False)
-        export_layout.addWidget(self.export_btn)
+        export_row.addWidget(self.export_btn, stretch=1)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setFixedHeight(50)
+        self.cancel_btn.setStyleSheet("QPushButton { background-color: #444; color: white; border-radius: 8px; padding: 0 16px; } QPushButton:hover { background-color: #c62828; }")
+        self.cancel_btn.clicked.connect(self.cancel_export)
+        self.cancel_btn.hide()
+        export_row.addWidget(self.cancel_btn)
+        export_layout.addLayout(export_row)
         
+        options_row = QHBoxLayout()
+        options_row.setSpacing(20)
         self.auto_save_chk = QCheckBox("Export in origin folder (suffix: _mix)")
-        export_layout.addWidget(self.auto_save_chk, alignment=Qt.AlignmentFlag.AlignCenter)
+        options_row.addWidget(self.auto_save_chk)
+        self.normalize_chk = QCheckBox(f"Normalize loudness ({LOUDNESS_TARGET:g} LUFS)")
+        self.normalize_chk.setChecked(False)
+        options_row.addWidget(self.normalize_chk)
+        export_layout.addLayout(options_row)
+        options_row.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         layout.addLayout(export_layout)
         self.check_ffmpeg()
 
     def check_ffmpeg(self):
-        si = subprocess.STARTUPINFO()
-        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        try:
-            subprocess.run([FFMPEG_BIN, '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
-        except FileNotFoundError:
-            try:
-                subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
-            except FileNotFoundError:
-                QMessageBox.critical(self, "Error", f"FFmpeg not found!\nMake sure that 'ffmpeg.exe' is in the same folder as this executable or installed in your system.")
-                sys.exit(1)
+        # L'avvio di ffmpeg non blocca più l'apertura della finestra
+        check = FFmpegCheckThread(self)
+        check.checked.connect(self.on_ffmpeg_checked)
+        check.finished.connect(check.deleteLater)
+        check.start()
+
+    def on_ffmpeg_checked(self, found):
+        if found: return
+        QMessageBox.critical(self, "Error", f"FFmpeg not found!\nMake sure that 'ffmpeg.exe' is in the same folder as this executable or installed in your system.")
+        # Chiamato dall'event loop: si esce da app.exec() con codice 1 invece di sys.exit
+        QApplication.exit(1)
 
     def close_clip(self):
+        if self.extractor:
+            try:
+                self.extractor.signals.peaks_ready.disconnect()
+                self.extractor.signals.failed.disconnect()
+            except: pass
+            self.extractor = None
+        self.player.stop()
+        self.player.setSource(QUrl())
+        self.active_track = None
+        # Un solo passaggio sulla lista: i widget escono subito dal layout, senza
+        # processEvents() né scansioni del layout per indice
         for w in self.track_widgets:
-            w.cleanup() 
+            w.cleanup()
+            self.tracks_layout.removeWidget(w)
+            w.hide()
             w.deleteLater()
-        QApplication.processEvents()
         self.track_widgets = []
         self.current_video_path = None
         self.video_duration = 0
@@ -542,18 +851,28 @@ class MainWindow(QMainWindow):
         self.current_video_path = path
         filename = os.path.basename(path)
         self.drop_section.set_loaded_state(True, filename)
-        
-        si = subprocess.STARTUPINFO()
-        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+        # Lo stesso file (non modificato) già visto in questa sessione non viene riesaminato
         try:
-            cmd = [FFPROBE_BIN, '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', '-select_streams', 'a', path]
-            try:
-                output = subprocess.check_output(cmd, startupinfo=si)
-            except FileNotFoundError:
-                cmd[0] = 'ffprobe'
-                output = subprocess.check_output(cmd, startupinfo=si)
+            st = os.stat(path)
+            self.probe_key = (path, st.st_mtime, st.st_size)
+        except OSError: self.probe_key = None
+        if self.probe_key in self.probe_cache:
+            self.on_probe_finished(path, self.probe_cache[self.probe_key])
+            return
+        
+        # ffprobe gira in background: la UI resta reattiva anche su container grandi.
+        # Il parent tiene vivo il thread se nel frattempo viene caricato un altro file.
+        probe = ProbeThread(path, self)
+        probe.finished_probe.connect(self.on_probe_finished)
+        probe.probe_error.connect(self.on_probe_error)
+        probe.finished.connect(probe.deleteLater)
+        probe.start()
 
-            data = json.loads(output)
+    def on_probe_finished(self, path, data):
+        if path != self.current_video_path: return
+        if self.probe_key: self.probe_cache[self.probe_key] = data
+        try:
             try: self.video_duration = float(data.get('format', {}).get('duration', 0))
             except: self.video_duration = 0
 
@@ -563,14 +882,100 @@ class MainWindow(QMainWindow):
                 self.close_clip()
                 return
             for idx, stream in enumerate(streams):
-                w = AudioTrackWidget(stream, idx, path, self.temp_dir)
+                w = AudioTrackWidget(stream, idx, path)
+                w.play_requested.connect(self.play_track)
+                w.volume_changed.connect(self.on_track_volume_changed)
+                w.seek_requested.connect(self.on_track_seek)
                 self.tracks_layout.addWidget(w)
                 self.track_widgets.append(w)
+
+            # File già aperto (in questa sessione o in una precedente): niente ffmpeg
+            cached = [self.peaks_cache.get((self.probe_key, w.index)) or load_cached_peaks(self.probe_key, w.index)
+                      for w in self.track_widgets] if self.probe_key else []
+            if self.probe_key and all(cached):
+                for w, (peaks, duration_ms) in zip(self.track_widgets, cached):
+                    w.waveform.set_peaks(peaks, duration_ms)
+                self.export_btn.setEnabled(True)
+                return
+
+            # Al caricamento serve solo la waveform: un unico ffmpeg a 8 kHz per tutte le tracce
+            peak_target = max(512, self.screen().availableGeometry().width())
+            self.extractor = WaveformExtractor(path, [w.index for w in self.track_widgets], peak_target, self.video_duration)
+            self.extractor.signals.peaks_ready.connect(self.on_waveform_ready)
+            self.extractor.signals.failed.connect(self.on_waveform_failed)
+            QThreadPool.globalInstance().start(self.extractor)
             self.export_btn.setEnabled(True)
         except Exception as e:
             QMessageBox.critical(self, "Error", str(e))
             self.close_clip()
 
+    def on_waveform_ready(self, idx, peaks, duration_ms):
+        if self.probe_key and peaks:
+            self.peaks_cache[(self.probe_key, idx)] = (peaks, duration_ms)
+            save_cached_peaks(self.probe_key, idx, peaks, duration_ms)
+        for w in self.track_widgets:
+            if w.index == idx:
+                w.waveform.set_peaks(peaks, duration_ms)
+                break
+
+    def on_waveform_failed(self, message):
+        for w in self.track_widgets: w.waveform.set_error(message)
+
+    def play_track(self, track):
+        playing = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+        if track is self.active_track and playing:
+            self.player.pause()
+            return
+        if track is not self.active_track:
+            self.player.stop()
+            if self.active_track: self.active_track.set_playing(False)
+            self.active_track = track
+            # L'anteprima è già in memoria: il player legge dal QBuffer, senza passare dal disco
+            track.preview_buffer.seek(0)
+            self.player.setSourceDevice(track.preview_buffer, QUrl("preview.wav"))
+        self.audio_output.setVolume(track.preview_volume)
+        self.player.play()
+
+    def on_track_volume_changed(self, track):
+        if track is self.active_track: self.audio_output.setVolume(track.preview_volume)
+
+    def on_track_seek(self, track, ms):
+        if track is self.active_track:
+            self.player.setPosition(ms)
+            return
+        # Il player ha un'altra sorgente: la posizione si applica quando la traccia viene caricata
+        track.seek_position = ms
+        track.waveform.set_position(ms)
+
+    def on_media_status_changed(self, status):
+        track = self.active_track
+        if status == QMediaPlayer.MediaStatus.LoadedMedia and track and track.seek_position is not None:
+            self.player.setPosition(track.seek_position)
+            track.seek_position = None
+
+    def on_player_state_changed(self, state):
+        playing = state == QMediaPlayer.PlaybackState.PlayingState
+        if playing: self.cursor_timer.start()
+        else:
+            self.cursor_timer.stop()
+            self.flush_cursor_position()
+        if self.active_track: self.active_track.set_playing(playing)
+
+    def on_player_position_changed(self, position):
+        self.pending_position = position
+        # Da fermo (seek in pausa) non c'è il timer: aggiorna subito
+        if not self.cursor_timer.isActive(): self.flush_cursor_position()
+
+    def flush_cursor_position(self):
+        if self.pending_position is None: return
+        if self.active_track: self.active_track.waveform.set_position(self.pending_position)
+        self.pending_position = None
+
+    def on_probe_error(self, path, message):
+        if path != self.current_video_path: return
+        QMessageBox.critical(self, "Error", message)
+        self.close_clip()
+
     def start_export(self):
         if not self.current_video_path: return
         
@@ -579,7 +984,7 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "No Audio", "Select at least one track.")
             return
         
-        for w in self.track_widgets: w.player.stop()
+        self.player.stop()
 
         src_dir = os.path.dirname(self.current_video_path)
         src_filename = os.path.basename(self.current_video_path)
@@ -591,9 +996,68 @@ class MainWindow(QMainWindow):
             out_path, _ = QFileDialog.getSaveFileName(self, "Save Video", src_dir, "Video Files (*.mp4 *.mkv *.mov)")
         if not out_path: return
 
-        cmd = [FFMPEG_BIN, '-y', '-i', self.current_video_path, '-map', '0:v', '-c:v', 'copy']
-        if not os.path.exists(FFMPEG_BIN) and shutil.which('ffmpeg'): cmd[0] = 'ffmpeg'
+        self.export_btn.start_export_mode()
+        self.cancel_btn.show()
+        self.pending_export = (active_tracks, ext, out_path)
+        if self.normalize_chk.isChecked():
+            # Misura prima la loudness del mix (ebur128 è leggero, solo audio):
+            # la correzione diventa un semplice guadagno, o nulla se già in target
+            cmd = [self.ffmpeg_cmd(), '-hide_banner', '-nostats', *FILTER_THREAD_ARGS, '-i', self.current_video_path,
+                   '-filter_complex', f"{self.build_mix_filter(active_tracks)};[aout]ebur128=framelog=quiet[ameas]",
+                   '-map', '[ameas]', '-f', 'null', '-']
+            self.loudness_thread = LoudnessThread(cmd, self)
+            self.loudness_thread.finished_measure.connect(self.on_loudness_measured)
+            self.loudness_thread.start()
+        else:
+            self.run_export(0.0)
+
+    def ffmpeg_cmd(self):
+        if not os.path.exists(FFMPEG_BIN) and shutil.which('ffmpeg'): return 'ffmpeg'
+        return FFMPEG_BIN
+
+    def on_loudness_measured(self, lufs, error):
+        gain_db = 0.0
+        if lufs is not None and abs(lufs - LOUDNESS_TARGET) >= LOUDNESS_TOLERANCE:
+            gain_db = round(LOUDNESS_TARGET - lufs, 1)
+        self.run_export(gain_db)
+        # L'export parte comunque, senza correzione: l'avviso non lo blocca
+        if error: QMessageBox.warning(self, "Loudness", f"Loudness measure failed, exporting without normalization.\n{error}")
+
+    def run_export(self, gain_db):
+        active_tracks, ext, out_path = self.pending_export
+        cmd = [self.ffmpeg_cmd(), '-y', '-nostats', '-progress', 'pipe:1', *FILTER_THREAD_ARGS,
+               '-i', self.current_video_path, '-map', '0:v', '-c:v', 'copy']
+        cmd.extend(self.build_audio_args(active_tracks, ext, out_path, gain_db))
+        cmd.append(out_path)
+
+        self.export_thread = ExportThread(cmd, self.video_duration)
+        self.export_thread.progress_update.connect(self.export_btn.set_progress)
+        self.export_thread.finished.connect(self.on_export_finished)
+        self.export_thread.start()
+
+    def build_audio_args(self, active_tracks, src_ext, out_path, gain_db=0.0):
+        # Una sola traccia senza gain né correzione di loudness, con codec accettato dal container
+        # di destinazione: basta un remux, niente decode -> filtri -> encode AAC
+        if (len(active_tracks) == 1 and active_tracks[0].get_current_db() == 0 and gain_db == 0
+                and self.can_copy_audio(active_tracks[0], src_ext, out_path)):
+            return ['-map', f'0:a:{active_tracks[0].index}', '-c:a', 'copy']
 
+        final_filter = self.build_mix_filter(active_tracks)
+        out_label = "[aout]"
+        if gain_db:
+            final_filter += f";[aout]volume={gain_db}dB[aout2]"
+            out_label = "[aout2]"
+        
+        return ['-filter_complex', final_filter, '-map', out_label, '-c:a', 'aac', '-b:a', '192k']
+
+    def can_copy_audio(self, track, src_ext, out_path):
+        out_ext = os.path.splitext(out_path)[1].lower()
+        if out_ext == src_ext.lower(): return True
+        allowed = COPY_AUDIO_CODECS.get(out_ext)
+        # None = il container accetta qualsiasi codec (mkv)
+        return out_ext in COPY_AUDIO_CODECS and (allowed is None or track.track_info.get('codec_name') in allowed)
+
+    def build_mix_filter(self, active_tracks):
         filter_parts = []
         mix_inputs = ""
         
@@ -605,30 +1069,47 @@ class MainWindow(QMainWindow):
             mix_inputs += f"[{output_label}]"
 
         volume_filters = ";".join(filter_parts)
-        final_filter = f"{volume_filters};{mix_inputs}amix=inputs={len(active_tracks)}[mixed];[mixed]dynaudnorm[aout]"
-        
-        cmd.extend(['-filter_complex', final_filter, '-map', '[aout]', '-c:a', 'aac', '-b:a', '192k', out_path])
+        # normalize=0: amix somma le tracce senza dividerle per N (più tracce non abbassano il volume di ognuna)
+        return f"{volume_filters};{mix_inputs}amix=inputs={len(active_tracks)}:normalize=0:duration=longest[aout]"
 
-        self.export_btn.start_export_mode()
-        self.export_thread = ExportThread(cmd, self.video_duration)
-        self.export_thread.progress_update.connect(self.export_btn.set_progress)
-        self.export_thread.finished.connect(self.on_export_finished)
-        self.export_thread.start()
+    def cancel_export(self):
+        if self.loudness_thread and self.loudness_thread.isRunning():
+            # Si ignora il risultato e si ferma il decode: un nuovo export non ne avvia un secondo in parallelo
+            try: self.loudness_thread.finished_measure.disconnect()
+            except: pass
+            self.loudness_thread.stop()
+            self.pending_export = None
+            self.cancel_btn.hide()
+            self.export_btn.reset_mode()
+        elif self.export_thread and self.export_thread.isRunning():
+            self.export_thread.stop()
 
     def on_export_finished(self, success, message):
+        self.cancel_btn.hide()
         self.export_btn.reset_mode()
+        out_path = self.pending_export[2] if self.pending_export else None
+        self.pending_export = None
         if success: QMessageBox.information(self, "Success", message)
+        elif not self.export_thread.is_running:
+            # File incompleto: non lasciarlo accanto al sorgente
+            if out_path and os.path.exists(out_path):
+                try: os.remove(out_path)
+                except OSError: pass
         else: QMessageBox.critical(self, "Error", message)
 
     def closeEvent(self, event):
+        # Un QThread distrutto mentre gira fa abortire l'app: anche la misura va fermata e attesa
+        if self.loudness_thread and self.loudness_thread.isRunning():
+            self.loudness_thread.stop()
+            self.loudness_thread.wait()
         if self.export_thread and self.export_thread.isRunning():
             self.export_thread.stop()
             self.export_thread.wait()
-        shutil.rmtree(self.temp_dir, ignore_errors=True)
         event.accept()
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    QThreadPool.globalInstance().setMaxThreadCount(max(2, (os.cpu_count() or 2) // 2))
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
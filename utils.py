@@ -1,5 +1,7 @@
 import sys
 import os
+import subprocess
+import array
 
 def get_ffmpeg_path(exe_name):
     """Gestisce i percorsi per FFmpeg sia in dev che in build EXE"""
@@ -15,19 +17,58 @@ def get_ffmpeg_path(exe_name):
 FFMPEG_BIN = get_ffmpeg_path("ffmpeg.exe")
 FFPROBE_BIN = get_ffmpeg_path("ffprobe.exe")
 
+HWACCEL_PRIORITY = ('cuda', 'qsv', 'videotoolbox', 'vaapi')
+
+def detect_hwaccel():
+    """Restituisce il primo hwaccel di HWACCEL_PRIORITY supportato da ffmpeg, oppure None"""
+    si = subprocess.STARTUPINFO()
+    si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    try:
+        out = subprocess.run([FFMPEG_BIN, '-hide_banner', '-hwaccels'], capture_output=True, text=True, startupinfo=si).stdout
+    except Exception:
+        return None
+    # Output: "Hardware acceleration methods:" seguito da un metodo per riga
+    available = {line.strip() for line in out.splitlines()[1:]}
+    return next((name for name in HWACCEL_PRIORITY if name in available), None)
+
+def stream_pcm_peaks(stream, channels=1, target=2000, block=80):
+    """Legge PCM s16le interleaved da uno stream a pezzi e lo riduce a ~target picchi int16 per canale.
+    Restituisce (array('h') di picchi per canale, campioni per canale)"""
+    # Per ogni canale si tiene solo il picco di ogni blocco di `block` campioni (int16):
+    # la memoria resta quella di un pezzo letto più pochi byte per blocco
+    block_peaks = [array.array('h') for _ in range(channels)]
+    # Pezzi da ~64 KB allineati ai blocchi, così nessun blocco è spezzato tra due letture
+    chunk_bytes = block * channels * 2 * max(1, 65536 // (block * channels * 2))
+    count = 0
+    while True:
+        raw = stream.read(chunk_bytes)
+        if not raw: break
+        # array('h') decodifica gli int16 in C, senza tupla di int Python né conversione a float
+        samples = array.array('h')
+        samples.frombytes(raw[:len(raw) - len(raw) % (2 * channels)])
+        if sys.byteorder == 'big': samples.byteswap()
+        count += len(samples) // channels
+        for c in range(channels):
+            # De-interleave con slice a passo fisso, anch'esso in C
+            channel = samples[c::channels] if channels > 1 else samples
+            out = block_peaks[c]
+            for i in range(0, len(channel), block):
+                chunk = channel[i:i+block]
+                if chunk: out.append(min(32767, max(max(chunk), -min(chunk))))
+
+    result = []
+    for out in block_peaks:
+        step = max(1, len(out) // target)
+        # Restano int16 (2 byte l'uno): la scala a 0..1 si applica solo al disegno
+        result.append(array.array('h', (max(out[i:i+step]) for i in range(0, len(out), step))))
+    return result, count
+
 def format_time(ms):
     """Converte millisecondi in formato MM:SS.ms"""
     seconds = (ms / 1000) % 60
     minutes = (ms / (1000 * 60)) % 60
     return f"{int(minutes):02d}:{seconds:05.2f}"
 
-def time_str_to_seconds(time_str):
-    try:
-        parts = time_str.split(':')
-        return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
-    except:
-        return 0.0
-        
 def resource_path(relative_path):
     """ Ottiene il percorso assoluto, funziona per dev e per PyInstaller """
     try:
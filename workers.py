@@ -1,34 +1,116 @@
 import subprocess
-import re
-from PyQt6.QtCore import QThread, pyqtSignal
-from utils import FFMPEG_BIN, FFPROBE_BIN
+import json
+from PyQt6.QtCore import QThread, QObject, QRunnable, pyqtSignal
+from utils import FFMPEG_BIN, FFPROBE_BIN, stream_pcm_peaks, detect_hwaccel
 
-class AudioExtractorThread(QThread):
-    finished_extraction = pyqtSignal(str, str) # path, index
+class ExtractorSignals(QObject):
+    finished_extraction = pyqtSignal(str, str, object, float) # path, index, picchi, durata ms
 
-    def __init__(self, input_video, track_index, output_path):
+class AudioExtractor(QRunnable):
+
+    SAMPLE_RATE = 8000
+
+    PEAK_TARGET = 2000
+
+    def __init__(self, input_video, outputs, duration_sec=0, peak_target=PEAK_TARGET):
+        """outputs: lista di (track_index, output_path), estratte tutte con un solo ffmpeg"""
         super().__init__()
+        self.signals = ExtractorSignals()
         self.input_video = input_video
-        self.track_index = track_index
-        self.output_path = output_path
+        self.outputs = outputs
+        self.duration_sec = duration_sec
+        self.peak_target = peak_target
+        self.process = None
+        self.is_running = True
 
     def run(self):
         si = subprocess.STARTUPINFO()
         si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         
-        cmd = [
-            FFMPEG_BIN, '-y', '-i', self.input_video,
-            '-map', f'0:a:{self.track_index}',
-            '-ac', '1', '-ar', '8000', '-f', 'wav', 
-            self.output_path
-        ]
+        # Un solo processo: il file viene letto e demuxato una volta per tutte le tracce.
+        # Ogni traccia ha il suo WAV per il player; per la waveform tutte le tracce finiscono
+        # come canali mono di un unico stream PCM grezzo su stdout (niente rilettura dal disco)
+        n = len(self.outputs)
+        # stderr va in DEVNULL: -nostats e -v error evitano anche di formattare le righe di stato
+        cmd = [FFMPEG_BIN, '-y', '-nostats', '-v', 'error', '-i', self.input_video]
+        for track_index, output_path in self.outputs:
+            cmd.extend(['-map', f'0:a:{track_index}', '-ac', '1', '-ar', str(self.SAMPLE_RATE), '-f', 'wav', output_path])
+        if n == 1:
+            cmd.extend(['-map', f'0:a:{self.outputs[0][0]}', '-ac', '1', '-ar', str(self.SAMPLE_RATE)])
+        else:
+            # amerge si ferma all'ingresso più corto: con la durata nota ogni traccia viene
+            # allungata con silenzio fino alla fine del file, così una traccia corta non tronca le altre
+            pad = f",apad=whole_dur={self.duration_sec}" if self.duration_sec > 0 else ""
+            parts = [f"[0:a:{idx}]aformat=sample_rates={self.SAMPLE_RATE}:channel_layouts=mono{pad}[w{i}]"
+                     for i, (idx, _) in enumerate(self.outputs)]
+            labels = "".join(f"[w{i}]" for i in range(n))
+            cmd.extend(['-filter_complex', f"{';'.join(parts)};{labels}amerge=inputs={n}[wave]", '-map', '[wave]'])
+            if self.duration_sec > 0: cmd.extend(['-t', str(self.duration_sec)])
+        cmd.extend(['-f', 's16le', 'pipe:1'])
+
+        if not self.is_running: return
         try:
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=si)
         except FileNotFoundError:
             cmd[0] = 'ffmpeg'
-            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
-            
-        self.finished_extraction.emit(self.output_path, str(self.track_index))
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, startupinfo=si)
+        # stop() può essere arrivato mentre il processo partiva
+        if not self.is_running: self.process.terminate()
+
+        # Picchi int16 calcolati man mano che il PCM arriva: l'audio intero non sta mai in memoria.
+        # Con la durata nota ogni blocco è già un picco finale (un max/min per colonna)
+        block = max(80, int(self.duration_sec * self.SAMPLE_RATE / self.peak_target))
+        all_peaks, count = stream_pcm_peaks(self.process.stdout, n, self.peak_target, block)
+        self.process.stdout.close()
+        self.process.wait()
+        # Estrazione interrotta: WAV e picchi sono parziali, non vanno segnalati
+        if not self.is_running: return
+        duration_ms = count / self.SAMPLE_RATE * 1000
+        for (track_index, output_path), peaks in zip(self.outputs, all_peaks):
+            self.signals.finished_extraction.emit(output_path, str(track_index), peaks, duration_ms)
+
+    def stop(self):
+        self.is_running = False
+        if self.process:
+            self.process.terminate()
+            self.process.wait()
+
+class ProbeThread(QThread):
+    finished_probe = pyqtSignal(str, object) # path, dati ffprobe
+    probe_error = pyqtSignal(str, str) # path, messaggio
+
+    def __init__(self, video_path, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+
+    def run(self):
+        si = subprocess.STARTUPINFO()
+        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        # Solo i campi usati dalla finestra: JSON molto più piccolo di -show_format -show_streams
+        cmd = [FFPROBE_BIN, '-v', 'quiet', '-print_format', 'json', '-show_entries',
+               'format=duration:stream=codec_type,codec_name,r_frame_rate:stream_tags=language', self.video_path]
+        try:
+            try:
+                output = subprocess.check_output(cmd, startupinfo=si)
+            except FileNotFoundError:
+                cmd[0] = 'ffprobe'
+                output = subprocess.check_output(cmd, startupinfo=si)
+            self.finished_probe.emit(self.video_path, json.loads(output))
+        except Exception as e:
+            self.probe_error.emit(self.video_path, str(e))
+
+class FFmpegCheckThread(QThread):
+    checked = pyqtSignal(bool, object) # ffmpeg trovato, hwaccel disponibile (o None)
+
+    def run(self):
+        # Due avvii di processo (su Windows decine di ms l'uno) fuori dal thread GUI
+        si = subprocess.STARTUPINFO()
+        si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        try: subprocess.run([FFMPEG_BIN, '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=si)
+        except Exception:
+            self.checked.emit(False, None)
+            return
+        self.checked.emit(True, detect_hwaccel())
 
 class ExportThread(QThread):
     progress_update = pyqtSignal(int)
@@ -55,24 +137,22 @@ class ExportThread(QThread):
                 startupinfo=si
             )
 
-            time_pattern = re.compile(r"time=(\d{2}:\d{2}:\d{2}\.\d{2})")
-            
-            def parse_time(t_str):
-                try:
-                    h, m, s = t_str.split(':')
-                    return float(h)*3600 + float(m)*60 + float(s)
-                except: return 0.0
-
+            # Il comando usa '-progress pipe:1 -nostats': ffmpeg scrive righe key=value,
+            # out_time_us è la posizione in microsecondi ("N/A" finché non parte l'encode)
+            last_percent = -1
             for line in self.process.stdout:
                 if not self.is_running:
                     self.process.terminate()
                     return
 
-                match = time_pattern.search(line)
-                if match and self.total_duration > 0:
-                    current_seconds = parse_time(match.group(1))
-                    percent = int((current_seconds / self.total_duration) * 100)
-                    self.progress_update.emit(min(99, percent))
+                if line.startswith('out_time_us=') and self.total_duration > 0:
+                    try: current_seconds = int(line[12:]) / 1_000_000
+                    except ValueError: continue
+                    percent = max(0, min(99, int((current_seconds / self.total_duration) * 100)))
+                    # Segnale (e repaint della barra) solo quando la percentuale cambia davvero
+                    if percent != last_percent:
+                        last_percent = percent
+                        self.progress_update.emit(percent)
             
             self.process.wait()
             
@@ -91,23 +171,31 @@ class ExportThread(QThread):
             self.process.terminate()
 
 class KeyframeLoaderThread(QThread):
-    keyframes_found = pyqtSignal(list)
+    keyframes_found = pyqtSignal(str, list, float) # path, keyframe ordinati della finestra (ms), inizio finestra (s)
 
-    def __init__(self, video_path):
-        super().__init__()
+    WINDOW_SEC = 300
+
+    def __init__(self, video_path, start_sec=0.0, parent=None):
+        """Legge i keyframe della finestra [start_sec, start_sec + WINDOW_SEC)"""
+        super().__init__(parent)
         self.video_path = video_path
+        self.start_sec = start_sec
 
     def run(self):
         si = subprocess.STARTUPINFO()
         si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        end_sec = self.start_sec + self.WINDOW_SEC
         
         # Metodo ottimizzato: Legge i pacchetti invece dei frame.
         # Filtra solo i pacchetti video che hanno il flag 'K' (Keyframe)
         # Molto più veloce e affidabile del metodo precedente.
+        # -read_intervals: ffprobe salta direttamente alla finestra richiesta invece di
+        # scandire tutto il file, così l'apertura di un film lungo non aspetta l'intera scansione
         cmd = [
             FFPROBE_BIN, 
             "-v", "error",
             "-select_streams", "v:0", 
+            "-read_intervals", f"{self.start_sec}%{end_sec}",
             "-show_entries", "packet=pts_time,flags", 
             "-of", "csv=p=0", 
             self.video_path
@@ -140,8 +228,9 @@ class KeyframeLoaderThread(QThread):
                         except ValueError:
                             pass
             
-            self.keyframes_found.emit(kf_list)
+            # Solo la finestra letta: l'unione con quelle già note la fa il thread GUI
+            self.keyframes_found.emit(self.video_path, sorted(set(kf_list)), self.start_sec)
             
         except Exception as e:
             print(f"Keyframe load error: {e}")
-            self.keyframes_found.emit([])
\ No newline at end of file
+            self.keyframes_found.emit(self.video_path, [], self.start_sec)